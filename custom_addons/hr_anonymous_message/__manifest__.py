@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'HR Anonymous Messaging System',
-    'version': '2.1.1',
+    'version': '2.1.3',
     'category': 'Human Resources',
     'summary': 'Fully anonymous messaging system with encrypted audit trail',
     'description': """
@@ -7,25 +7,28 @@ import json
 class AnonymousMessageController(http.Controller):
 
     @http.route('/api/anonymous/message', type='jsonrpc', auth='user', methods=['POST'], csrf=False)
-    def send_anonymous_message(self, **kw):
+    def send_anonymous_message(self, subject=None, message=None, category_id=None, **kw):
         """API endpoint to send anonymous message"""
         try:
-            data = request.jsonrequest
-            
-            # Create the message
-            message = request.env['hr.anonymous.message'].create({
-                'name': data.get('subject'),
-                'description': data.get('message'),
-                'category': data.get('category', 'general'),
+            # Create the message; the draft is sent straight away, so skip
+            # the creator subscription, creation log and tracking
+            record = request.env['hr.anonymous.message'].with_context(
+                mail_create_nosubscribe=True,
+                mail_create_nolog=True,
+                tracking_disable=True,
+            ).create({
+                'name': subject,
+                'description': message,
+                'category_id': category_id,
             })
             
             # Send to HR
-            message.send_to_hr()
+            record.send_to_hr()
             
             return {
                 'success': True,
                 'message': 'Your anonymous message has been sent to HR management successfully',
-                'message_id': message.id
+                'message_id': record.id
             }
         except Exception as e:
             return {
@@ -36,25 +39,16 @@ class AnonymousMessageController(http.Controller):
     @http.route('/api/anonymous/categories', type='jsonrpc', auth='user', methods=['GET'], csrf=False)
     def get_message_categories(self):
         """Get available categories for anonymous messages"""
-        categories = request.env['hr.anonymous.message']._fields['category'].selection
+        categories = request.env['hr.anonymous.message.category']._get_category_choices()
         
         return {
             'categories': [
-                {'value': cat[0], 'label': cat[1]} 
-                for cat in categories
+                {'value': cat_id, 'label': name}
+                for cat_id, name in categories
             ]
         }
 
     @http.route('/api/anonymous/status', type='jsonrpc', auth='user', methods=['GET'], csrf=False)
     def get_anonymous_system_status(self):
         """Check if anonymous messaging system is available"""
-        hr_email = request.env['ir.config_parameter'].sudo().get_param(
-            'hr_anonymous_message.hr_email',
-            default='hr@company.com'
-        )
-        
-        return {
-            'available': True,
-            'hr_email_configured': hr_email != 'hr@company.com',
-            'message': 'Anonymous messaging system is operational'
-        }
\ No newline at end of file
+        return dict(request.env['hr.anonymous.message']._status_payload())
\ No newline at end of file
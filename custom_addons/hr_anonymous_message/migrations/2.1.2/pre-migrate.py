@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """mail_id became a plain Integer: drop the old foreign key to mail_mail."""
+
+    _logger.info("=== HR Anonymous Message: dropping mail_id foreign key ===")
+
+    cr.execute("""
+        ALTER TABLE hr_anonymous_message
+        DROP CONSTRAINT IF EXISTS hr_anonymous_message_mail_id_fkey;
+    """)
+
+    _logger.info("=== mail_id foreign key dropped ===")
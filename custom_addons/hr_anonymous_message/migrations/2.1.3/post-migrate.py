@@ -0,0 +1,49 @@
+# -*- coding: utf-8 -*-
+"""
+Migration: 2.1.2 → 2.1.3
+Audit hashes switched from sha256("<uid>_<secret>") to keyed BLAKE2b.
+Recompute the stored hashes from sender_user_id so is_my_message and the
+audit log keep matching existing messages.
+"""
+import hashlib
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    if not version:
+        return
+
+    _logger.info("=== HR Anonymous Message: rehashing sender audit hashes ===")
+
+    cr.execute("SELECT value FROM ir_config_parameter WHERE key = 'database.secret'")
+    row = cr.fetchone()
+    secret = row[0] if row else 'default_secret_change_in_production'
+    key = secret.encode()[:64]
+
+    cr.execute("""
+        SELECT DISTINCT sender_user_id
+        FROM hr_anonymous_message
+        WHERE sender_user_id IS NOT NULL
+    """)
+    user_ids = [r[0] for r in cr.fetchall()]
+
+    for user_id in user_ids:
+        user_hash = hashlib.blake2b(
+            str(user_id).encode(), key=key, digest_size=32,
+        ).hexdigest()
+        cr.execute("""
+            UPDATE hr_anonymous_message
+            SET sender_audit_hash = %s
+            WHERE sender_user_id = %s
+        """, (user_hash, user_id))
+        cr.execute("""
+            UPDATE hr_anonymous_message_audit audit
+            SET user_hash = %s
+            FROM hr_anonymous_message msg
+            WHERE audit.message_id = msg.id
+              AND msg.sender_user_id = %s
+        """, (user_hash, user_id))
+
+    _logger.info(f"=== Rehashed audit trail for {len(user_ids)} senders ===")
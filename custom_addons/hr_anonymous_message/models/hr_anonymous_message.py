@@ -1,14 +1,112 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import UserError, ValidationError
+from jinja2 import Environment
+from markupsafe import Markup
 import logging
 from datetime import datetime, date, timedelta
 import hashlib
-import base64
 import io
 
 _logger = logging.getLogger(__name__)
 
+# Messages read per slice while streaming the Excel export
+_EXPORT_BATCH_SIZE = 2000
+
+# HTML body of the monthly report mail sent by _cron_send_monthly_report()
+_MONTHLY_REPORT_EMAIL_TEMPLATE = Environment(autoescape=True).from_string("""<div style="font-family:Arial,sans-serif;max-width:700px;margin:0 auto;
+            background:#f4f4f4;padding:20px;">
+
+  <!-- Header -->
+  <div style="background:linear-gradient(135deg,#2E5090 0%,#4A90D9 100%);
+              padding:32px 30px;border-radius:8px 8px 0 0;text-align:center;">
+    <div style="font-size:38px;margin-bottom:8px;">📊</div>
+    <h1 style="color:#fff;margin:0;font-size:22px;font-weight:bold;">
+      Monthly Anonymous Messages Report
+    </h1>
+    <p style="color:#d0e4f7;margin:8px 0 0;font-size:13px;">{{ month_name }}</p>
+  </div>
+
+  <!-- Body -->
+  <div style="background:#fff;padding:30px;
+              border-left:1px solid #e0e0e0;border-right:1px solid #e0e0e0;">
+
+    <p style="font-size:15px;color:#333;margin-top:0;">Dear HR Team,</p>
+    <p style="font-size:14px;color:#555;line-height:1.7;">
+      Please find attached the <strong>monthly Excel report</strong> for
+      <strong>{{ month_name }}</strong>, automatically generated by the
+      HR Anonymous Messaging System.
+    </p>
+
+    <!-- Stats card -->
+    <div style="background:#f8f9fa;border:1px solid #e9ecef;border-radius:6px;
+                padding:20px;margin:20px 0;">
+      <h3 style="margin:0 0 16px;color:#2E5090;font-size:15px;
+                 border-bottom:2px solid #2E5090;padding-bottom:8px;">
+        📋 Report Summary — {{ month_name }}
+      </h3>
+      <table style="width:100%;font-size:13px;border-collapse:collapse;">
+        <tr>
+          <td style="padding:8px 0;color:#888;width:200px;">Total Messages</td>
+          <td style="padding:8px 0;font-weight:bold;color:#222;">{{ total }}</td>
+        </tr>
+        <tr style="border-top:1px solid #f0f0f0;">
+          <td style="padding:8px 0;color:#888;">✅ Resolved</td>
+          <td style="padding:8px 0;font-weight:bold;color:#2e7d32;">{{ resolved }}</td>
+        </tr>
+        <tr style="border-top:1px solid #f0f0f0;">
+          <td style="padding:8px 0;color:#888;">🔄 In Progress</td>
+          <td style="padding:8px 0;font-weight:bold;color:#e65100;">{{ in_progress }}</td>
+        </tr>
+        <tr style="border-top:1px solid #f0f0f0;">
+          <td style="padding:8px 0;color:#888;">⏳ Pending Review</td>
+          <td style="padding:8px 0;font-weight:bold;color:#c62828;">{{ pending }}</td>
+        </tr>
+        <tr style="border-top:1px solid #f0f0f0;">
+          <td style="padding:8px 0;color:#888;">🔒 Closed by Employee</td>
+          <td style="padding:8px 0;font-weight:bold;color:#555;">{{ closed }}</td>
+        </tr>
+      </table>
+    </div>
+
+    <!-- Attachment notice -->
+    <div style="background:#e8f5e9;border:1px solid #a5d6a7;border-radius:4px;
+                padding:12px 16px;margin:20px 0;">
+      <p style="margin:0;font-size:13px;color:#2e7d32;">
+        📎 <strong>Attached:</strong> <em>{{ filename }}</em><br/>
+        Contains two sheets:
+        <strong>Anonymous Messages</strong> (full list) and
+        <strong>Summary</strong> (category &amp; status breakdown).
+      </p>
+    </div>
+
+    <!-- Privacy notice -->
+    <div style="background:#fff3cd;border:1px solid #ffc107;border-radius:4px;
+                padding:12px 16px;margin:20px 0;">
+      <p style="margin:0;font-size:12px;color:#856404;">
+        🛡️ <strong>Privacy Notice:</strong> Sender identities are NOT included.
+        All messages remain fully anonymous in compliance with company policy.
+      </p>
+    </div>
+
+    <p style="font-size:13px;color:#555;margin-bottom:0;line-height:1.6;">
+      Kind regards,<br/>
+      <strong>HR Anonymous Messaging System</strong><br/>
+      <span style="color:#aaa;font-size:11px;">
+        Automated message — please do not reply.
+      </span>
+    </p>
+  </div>
+
+  <!-- Footer -->
+  <div style="background:#eee;padding:14px;text-align:center;
+              border-radius:0 0 8px 8px;border:1px solid #e0e0e0;border-top:none;">
+    <p style="margin:0;font-size:11px;color:#999;">
+      Generated on {{ generated_on }} — Confidential HR Document.
+    </p>
+  </div>
+</div>""")
+
 class HrAnonymousMessage(models.Model):
     _name = 'hr.anonymous.message'
     _description = 'Anonymous HR Message'
@@ -48,7 +146,7 @@ class HrAnonymousMessage(models.Model):
     ], string='Status', default='draft', required=True, tracking=True)
 
     sender_audit_hash = fields.Char(
-        string='Audit Hash', readonly=True,
+        string='Audit Hash', readonly=True, index=True,
         help='Encrypted audit trail - not viewable in UI'
     )
     sender_user_id = fields.Many2one(
@@ -67,7 +165,7 @@ class HrAnonymousMessage(models.Model):
         groups='hr.group_hr_user', tracking=True
     )
     mail_sent = fields.Boolean(string='Email Sent', default=False, readonly=True)
-    mail_id = fields.Many2one('mail.mail', string='Email Record', readonly=True)
+    mail_id = fields.Integer(string='Email Record ID', readonly=True, copy=False)
     is_closed_by_employee = fields.Boolean(
         string='Closed by Employee', default=False, readonly=True
     )
@@ -87,6 +185,29 @@ class HrAnonymousMessage(models.Model):
         search='_search_is_my_message'
     )
 
+    def init(self):
+        # Status filters combined with the default create_date ordering
+        tools.create_index(
+            self.env.cr, 'hr_anonymous_message_state_create_date_idx',
+            self._table, ['state', 'create_date DESC'],
+        )
+        # Monthly report domain: create_date range over non-draft messages
+        tools.create_index(
+            self.env.cr, 'hr_anonymous_message_create_date_state_idx',
+            self._table, ['create_date', 'state'],
+            where="state != 'draft'",
+        )
+
+    @tools.lazy_classproperty
+    def _state_labels(cls):
+        """Status value → label map, built once per registry"""
+        return dict(cls._fields['state'].selection)
+
+    @tools.lazy_classproperty
+    def _priority_labels(cls):
+        """Priority value → label map, built once per registry"""
+        return dict(cls._fields['priority'].selection)
+
     @api.depends('create_date')
     def _compute_date_period(self):
         today = date.today()
@@ -153,12 +274,12 @@ class HrAnonymousMessage(models.Model):
 
     @api.depends('sender_audit_hash')
     def _compute_is_my_message(self):
-        for record in self:
-            current_user_hash = self._generate_user_hash(self.env.user.id)
-            record.is_my_message = record.sender_audit_hash == current_user_hash
+        current_user_hash = self._current_user_hash()
+        for record, audit_hash in zip(self, self.mapped('sender_audit_hash')):
+            record.is_my_message = audit_hash == current_user_hash
 
     def _search_is_my_message(self, operator, value):
-        current_user_hash = self._generate_user_hash(self.env.user.id)
+        current_user_hash = self._current_user_hash()
         if operator == '=' and value:
             return [('sender_audit_hash', '=', current_user_hash)]
         return [('sender_audit_hash', '!=', current_user_hash)]
@@ -170,26 +291,63 @@ class HrAnonymousMessage(models.Model):
         return super().read(fields=fields, load=load)
 
     @api.model
-    def _generate_user_hash(self, user_id):
+    @tools.ormcache()
+    def _audit_hash_key(self):
+        """BLAKE2b key derived from database.secret (max 64 bytes)"""
         secret = self.env['ir.config_parameter'].sudo().get_param(
             'database.secret', default='default_secret_change_in_production'
         )
-        return hashlib.sha256(f"{user_id}_{secret}".encode()).hexdigest()
+        return secret.encode()[:64]
+
+    @api.model
+    def _generate_user_hash(self, user_id):
+        return hashlib.blake2b(
+            str(user_id).encode(), key=self._audit_hash_key(), digest_size=32,
+        ).hexdigest()
+
+    @api.model
+    @tools.ormcache('self.env.uid')
+    def _current_user_hash(self):
+        """Audit hash of the current user, cached until config parameters change"""
+        return self._generate_user_hash(self.env.uid)
+
+    @api.model
+    @tools.ormcache()
+    def _get_hr_email(self):
+        """HR email from settings, cached until the next config parameter write"""
+        return (self.env['ir.config_parameter'].sudo().get_param(
+            'hr_anonymous_message.hr_email', default=''
+        ) or '').strip()
+
+    @api.model
+    @tools.ormcache()
+    def _status_payload(self):
+        """Response of the /api/anonymous/status endpoint (treat as read-only)"""
+        hr_email = self._get_hr_email()
+        return {
+            'available': True,
+            'hr_email_configured': bool(hr_email) and hr_email != 'hr@company.com',
+            'message': 'Anonymous messaging system is operational',
+        }
+
+    @api.model
+    @tools.ormcache('xmlid')
+    def _ref_id(self, xmlid):
+        """Database id behind an XML id (False if missing), cached per registry"""
+        record = self.env.ref(xmlid, raise_if_not_found=False)
+        return record.id if record else False
 
     def message_post(self, **kwargs):
-        bot_partner = self.env.ref('base.partner_root')
-        kwargs['author_id'] = bot_partner.id
+        kwargs['author_id'] = self._ref_id('base.partner_root')
         kwargs.pop('email_from', None)
         return super(HrAnonymousMessage, self.sudo()).message_post(**kwargs)
 
     def _message_compute_author(self, author_id=None, email_from=None, raise_on_email=True):
-        bot_partner = self.env.ref('base.partner_root')
         company_email = self.env.company.email or 'noreply@localhost'
-        return bot_partner.id, f"Anonymous HR System <{company_email}>"
+        return self._ref_id('base.partner_root'), f"Anonymous HR System <{company_email}>"
 
     def _message_log(self, **kwargs):
-        bot_partner = self.env.ref('base.partner_root')
-        kwargs['author_id'] = bot_partner.id
+        kwargs['author_id'] = self._ref_id('base.partner_root')
         return super(HrAnonymousMessage, self.sudo())._message_log(**kwargs)
 
     def _message_notify_by_email(self, message, recipients_data, **kwargs):
@@ -208,26 +366,39 @@ class HrAnonymousMessage(models.Model):
         - Does NOT send any email — emails are handled exclusively
           by the monthly cron job (_cron_send_monthly_report)
         """
-        self.ensure_one()
+        # _write() below bypasses access checks, so enforce the caller's
+        # write access (ACLs + record rules) explicitly
+        self.check_access('write')
 
-        ICP = self.env['ir.config_parameter'].sudo()
-        hr_email = ICP.get_param('hr_anonymous_message.hr_email', default='').strip()
+        hr_email = self._get_hr_email()
         if not hr_email:
             raise UserError(_(
                 'HR email is not configured. Please ask your administrator to '
                 'configure it in Settings → HR Anonymous Messages.'
             ))
 
+        # Only drafts can be submitted; already-processed messages keep
+        # their state, audit trail and HR activities untouched
+        messages = self.filtered(lambda m: m.state == 'draft')
+
         _logger.info(
-            f"Anonymous message '{self.name}' submitted — "
-            f"Hash: {self.sender_audit_hash[:8]}... (no email sent, monthly cron will handle)"
+            "Anonymous message(s) %s submitted (no email sent, monthly cron will handle)",
+            messages.ids,
         )
 
-        self._create_audit_log()
+        if messages:
+            # One superuser recordset for the audit + notification steps, so
+            # they share a single environment (and its prefetch cache)
+            sudo_messages = messages.sudo()
+            sudo_messages._create_audit_log()
 
-        self.write({'state': 'sent', 'mail_sent': False})
+            # draft → sent needs no tracking, constraint check or status-change
+            # note (HR is notified below), so skip the write() stack
+            messages.flush_recordset(['state'])
+            messages._write({'state': 'sent'})
+            messages.invalidate_recordset(['state'])
 
-        self._notify_hr_users()
+            sudo_messages._notify_hr_users()
 
         return {
             'type': 'ir.actions.client',
@@ -245,16 +416,19 @@ class HrAnonymousMessage(models.Model):
         }
 
     def _create_audit_log(self):
-        self.env['hr.anonymous.message.audit'].sudo().create({
-            'message_id': self.id,
-            'user_hash': self.sender_audit_hash,
-            'timestamp': fields.Datetime.now(),
+        """Called on a sudo recordset by send_to_hr"""
+        now = fields.Datetime.now()
+        self.env['hr.anonymous.message.audit'].create([{
+            'message_id': record.id,
+            'user_hash': record.sender_audit_hash,
+            'timestamp': now,
             'action': 'message_sent',
-        })
+        } for record in self])
 
     def _notify_hr_users(self):
-        """Notify HR users inside Odoo — no email, fully anonymous"""
-        hr_group = self.env.ref('hr.group_hr_user', raise_if_not_found=False)
+        """Notify HR users inside Odoo — no email, fully anonymous.
+        Called on a sudo recordset by send_to_hr."""
+        hr_group = self.env['res.groups'].browse(self._ref_id('hr.group_hr_user'))
         if not hr_group:
             return
         hr_users = hr_group.user_ids
@@ -263,23 +437,40 @@ class HrAnonymousMessage(models.Model):
 
         partner_ids = hr_users.mapped('partner_id').ids
 
-        self.sudo().message_post(
-            body=_('A new anonymous message has been received: <strong>%s</strong>') % self.name,
-            subject=_('New Anonymous Message'),
-            partner_ids=partner_ids,
-            message_type='notification',
-            subtype_xmlid='mail.mt_comment',
-        )
-        self.sudo().activity_schedule(
-            'mail.mail_activity_data_todo',
-            summary=_('New Anonymous Message: %s') % self.name,
-            note=_('Category: %s') % (self.category_id.name if self.category_id else ''),
-            user_id=hr_users[0].id,
+        for record in self:
+            # Queue the HR notification emails for the mail cron instead of
+            # sending them over SMTP inside the employee's request
+            record.with_context(mail_notify_force_send=False).message_post(
+                body=Markup(_('A new anonymous message has been received: <strong>%s</strong>')) % record.name,
+                subject=_('New Anonymous Message'),
+                partner_ids=partner_ids,
+                message_type='notification',
+                subtype_xmlid='mail.mt_comment',
+            )
+
+        # One batched insert for the HR to-do activities rather than an
+        # activity_schedule() call per message
+        activity_type = self.env['mail.activity.type'].browse(
+            self._ref_id('mail.mail_activity_data_todo')
         )
+        if not activity_type:
+            return
+        date_deadline = activity_type._get_date_deadline()
+        res_model_id = self.env['ir.model']._get_id(self._name)
+        self.env['mail.activity'].create([{
+            'activity_type_id': activity_type.id,
+            'res_model_id': res_model_id,
+            'res_id': record.id,
+            'summary': _('New Anonymous Message: %s') % record.name,
+            'note': _('Category: %s') % (record.category_id.name if record.category_id else ''),
+            'date_deadline': date_deadline,
+            'user_id': hr_users[0].id,
+            'automated': True,
+        } for record in self])
 
     def _notify_employee_status_change(self, old_state):
         if old_state != self.state:
-            status_label = dict(self._fields['state'].selection).get(self.state)
+            status_label = self._state_labels.get(self.state)
             self.message_post(
                 body=_('Your message "%s" status changed to: %s') % (self.name, status_label),
                 subject=_('Message Status Updated'),
@@ -287,33 +478,34 @@ class HrAnonymousMessage(models.Model):
                 subtype_xmlid='mail.mt_comment',
             )
 
-    def action_acknowledge(self):
+    def _with_transition_tracking(self):
+        """Buttons pass from_ui and keep state tracking; programmatic
+        (bulk, cron) transitions skip the tracking messages"""
+        if self.env.context.get('from_ui'):
+            return self
+        return self.with_context(tracking_disable=True, mail_notrack=True)
+
+    def _transition(self, new_state):
+        """Shared body of the HR status buttons"""
         self.ensure_one()
         old_state = self.state
-        self.write({'state': 'acknowledged'})
+        # Bypass our write() override: it would post the same status note
+        # that is posted right below
+        super(HrAnonymousMessage, self._with_transition_tracking()).write({'state': new_state})
         self._notify_employee_status_change(old_state)
         return True
 
+    def action_acknowledge(self):
+        return self._transition('acknowledged')
+
     def action_in_progress(self):
-        self.ensure_one()
-        old_state = self.state
-        self.write({'state': 'in_progress'})
-        self._notify_employee_status_change(old_state)
-        return True
+        return self._transition('in_progress')
 
     def action_resolve(self):
-        self.ensure_one()
-        old_state = self.state
-        self.write({'state': 'resolved'})
-        self._notify_employee_status_change(old_state)
-        return True
+        return self._transition('resolved')
 
     def action_decline(self):
-        self.ensure_one()
-        old_state = self.state
-        self.write({'state': 'declined'})
-        self._notify_employee_status_change(old_state)
-        return True
+        return self._transition('declined')
 
     def action_close_ticket(self):
         self.ensure_one()
@@ -321,7 +513,7 @@ class HrAnonymousMessage(models.Model):
             raise UserError(_('You can only close your own messages.'))
         if self.state == 'draft':
             raise UserError(_('You cannot close a message that has not been sent yet.'))
-        self.write({
+        self._with_transition_tracking().write({
             'state': 'closed',
             'is_closed_by_employee': True,
             'closed_date': fields.Datetime.now(),
@@ -337,32 +529,23 @@ class HrAnonymousMessage(models.Model):
             }
         }
 
-    @api.model
+    @api.model_create_multi
     def create(self, vals_list):
-        if isinstance(vals_list, dict):
-            vals_list = [vals_list]
         real_user_id = self.env.user.id
+        # Every record in the batch shares the same sender
+        user_hash = self._current_user_hash()
         for vals in vals_list:
-            vals['sender_audit_hash'] = self._generate_user_hash(real_user_id)
+            vals['sender_audit_hash'] = user_hash
             vals['sender_user_id'] = real_user_id
-        records = super(HrAnonymousMessage, self.sudo()).create(vals_list)
-        for record in records:
-            self.env.cr.execute(
-                "UPDATE hr_anonymous_message SET sender_user_id = %s WHERE id = %s",
-                (real_user_id, record.id)
-            )
-        self.env.cr.flush()
-        records.invalidate_recordset(['sender_user_id'])
-        return records
+        return super(HrAnonymousMessage, self.sudo()).create(vals_list)
 
     def write(self, vals):
+        old_states = {record.id: record.state for record in self} if 'state' in vals else {}
+        res = super(HrAnonymousMessage, self).write(vals)
         for record in self:
-            old_state = record.state
-            res = super(HrAnonymousMessage, record).write(vals)
-            if 'state' in vals and old_state != vals['state']:
-                record._notify_employee_status_change(old_state)
-            return res
-        return super(HrAnonymousMessage, self).write(vals)
+            if record.id in old_states and old_states[record.id] != vals['state']:
+                record._notify_employee_status_change(old_states[record.id])
+        return res
 
     @api.constrains('state')
     def _check_state_change_permission(self):
@@ -372,30 +555,45 @@ class HrAnonymousMessage(models.Model):
                 if record.state not in ['draft', 'sent', 'closed']:
                     raise ValidationError(_('Only HR users can change message status.'))
 
-    def _generate_excel_export(self, messages):
+    @api.model
+    def _get_report_counts(self, domain):
+        """
+        Message counts for a report domain, grouped in SQL.
+        Returns ({category label: count}, {state: count}).
+        """
+        Message = self.sudo()
+        # Keyed by label and summed: category names are not unique
+        category_counts = {}
+        for group in Message.read_group(domain, fields=['category_id'], groupby=['category_id']):
+            label = group['category_id'][1] if group['category_id'] else 'Unknown'
+            category_counts[label] = category_counts.get(label, 0) + group['category_id_count']
+        state_counts = {
+            group['state']: group['state_count']
+            for group in Message.read_group(domain, fields=['state'], groupby=['state'])
+        }
+        return category_counts, state_counts
+
+    def _generate_excel_export(self, messages, category_counts, state_counts):
         """
         Build a styled two-sheet Excel workbook for the monthly report.
         Sheet 1: full message list (no sender identity).
-        Sheet 2: category + status summary.
+        Sheet 2: category + status summary, from _get_report_counts().
+
+        The workbook is write-only and messages are read in slices of
+        _EXPORT_BATCH_SIZE, so only one slice of rows is held in memory.
         """
         try:
             import openpyxl
-            from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+            from openpyxl.cell import WriteOnlyCell
+            from openpyxl.utils import get_column_letter
+            from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
         except ImportError:
             raise UserError(_('openpyxl is required. Run: pip install openpyxl'))
 
-        category_labels = {
-            'complaint': 'Complaint', 'suggestion': 'Suggestion',
-            'concern': 'Concern', 'harassment': 'Harassment Report',
-            'discrimination': 'Discrimination Report', 'safety': 'Safety Issue',
-            'ethics': 'Ethics Violation', 'general': 'General Message',
-        }
-        priority_labels = {'0': 'Low', '1': 'Normal', '2': 'High', '3': 'Urgent'}
-        state_labels = {
-            'draft': 'Draft', 'sent': 'Sent', 'acknowledged': 'Acknowledged',
-            'in_progress': 'In Progress', 'resolved': 'Resolved',
-            'declined': 'Declined', 'closed': 'Closed by Employee',
-        }
+        # Bound once, outside the per-row loop
+        priority_label = self._priority_labels.get
+        state_label = self._state_labels.get
+        date_fmt = 'yyyy-mm-dd hh:mm'
 
         thin = Side(style='thin', color='CCCCCC')
         bdr = Border(left=thin, right=thin, top=thin, bottom=thin)
@@ -406,10 +604,35 @@ class HrAnonymousMessage(models.Model):
         d_align = Alignment(vertical='center', wrap_text=True)
         alt_fill = PatternFill(start_color='F0F4F8', end_color='F0F4F8', fill_type='solid')
 
-        wb = openpyxl.Workbook()
+        wb = openpyxl.Workbook(write_only=True)
 
-        ws = wb.active
-        ws.title = "Anonymous Messages"
+        # Data cells share two registered styles instead of each cell
+        # getting its own font/alignment/border/fill assigned
+        wb.add_named_style(NamedStyle(
+            name='hr_data', font=d_font, alignment=d_align, border=bdr,
+        ))
+        wb.add_named_style(NamedStyle(
+            name='hr_data_alt', font=d_font, alignment=d_align, border=bdr, fill=alt_fill,
+        ))
+
+        ws = wb.create_sheet(title="Anonymous Messages")
+
+        def cell(sheet, value, font=None, fill=None, alignment=None, border=None,
+                 number_format=None, style=None):
+            c = WriteOnlyCell(sheet, value=value)
+            if style:
+                c.style = style
+            if font:
+                c.font = font
+            if fill:
+                c.fill = fill
+            if alignment:
+                c.alignment = alignment
+            if border:
+                c.border = border
+            if number_format:
+                c.number_format = number_format
+            return c
 
         headers = [
             'ID', 'Subject', 'Category', 'Priority', 'Status',
@@ -418,110 +641,103 @@ class HrAnonymousMessage(models.Model):
         ]
         col_widths = [8, 35, 20, 12, 18, 20, 20, 18, 40, 40]
 
-        for col, (hdr, w) in enumerate(zip(headers, col_widths), 1):
-            c = ws.cell(row=1, column=col, value=hdr)
-            c.font = h_font
-            c.fill = h_fill
-            c.alignment = h_align
-            c.border = bdr
-            ws.column_dimensions[c.column_letter].width = w
+        # Dimensions must be set before the rows they apply to are streamed
+        for col, w in enumerate(col_widths, 1):
+            ws.column_dimensions[get_column_letter(col)].width = w
         ws.row_dimensions[1].height = 30
-
-        for row, msg in enumerate(messages, 2):
-            row_data = [
-                msg.id,
-                msg.name or '',
-                msg.category_id.name if msg.category_id else '',
-                priority_labels.get(msg.priority, msg.priority or ''),
-                state_labels.get(msg.state, msg.state or ''),
-                msg.create_date.strftime('%Y-%m-%d %H:%M') if msg.create_date else '',
-                msg.closed_date.strftime('%Y-%m-%d %H:%M') if msg.closed_date else '',
-                'Yes' if msg.is_closed_by_employee else 'No',
-                msg.hr_notes or '',
-                msg.resolution_notes or '',
-            ]
-            use_alt = (row % 2 == 0)
-            for col, val in enumerate(row_data, 1):
-                c = ws.cell(row=row, column=col, value=val)
-                c.font = d_font
-                c.alignment = d_align
-                c.border = bdr
-                if use_alt:
-                    c.fill = alt_fill
-            ws.row_dimensions[row].height = 20
+        ws.append([cell(ws, hdr, h_font, h_fill, h_align, bdr) for hdr in headers])
+
+        # Only the exported columns (no description HTML), one slice at a
+        # time; each slice is dropped from the cache once it is written
+        row = 1
+        for ids in tools.split_every(_EXPORT_BATCH_SIZE, messages.ids):
+            batch = messages.browse(ids)
+            for msg in batch.read([
+                'name', 'category_id', 'priority', 'state', 'create_date',
+                'closed_date', 'is_closed_by_employee', 'hr_notes', 'resolution_notes',
+            ]):
+                row += 1
+                row_data = [
+                    msg['id'],
+                    msg['name'] or '',
+                    msg['category_id'][1] if msg['category_id'] else '',
+                    priority_label(msg['priority'], msg['priority'] or ''),
+                    state_label(msg['state'], msg['state'] or ''),
+                    msg['create_date'] or '',
+                    msg['closed_date'] or '',
+                    'Yes' if msg['is_closed_by_employee'] else 'No',
+                    msg['hr_notes'] or '',
+                    msg['resolution_notes'] or '',
+                ]
+                style = 'hr_data_alt' if row % 2 == 0 else 'hr_data'
+                ws.row_dimensions[row].height = 20
+                # Dates stay real Excel datetimes, so the columns sort
+                ws.append([
+                    cell(ws, val, style=style,
+                         number_format=date_fmt if isinstance(val, datetime) else None)
+                    for val in row_data
+                ])
+            batch.invalidate_recordset()
 
         ws2 = wb.create_sheet(title="Summary")
         ws2.column_dimensions['A'].width = 25
         ws2.column_dimensions['B'].width = 12
         ws2.column_dimensions['C'].width = 15
 
-        ws2.merge_cells('A1:C1')
-        ws2['A1'] = 'Anonymous Messages — Monthly Summary'
-        ws2['A1'].font = Font(name='Arial', bold=True, size=14, color='2E5090')
-        ws2['A1'].alignment = Alignment(horizontal='center')
+        # Write-only sheets cannot merge cells; the titles sit in column A
         ws2.row_dimensions[1].height = 30
-
-        ws2.merge_cells('A2:C2')
-        ws2['A2'] = f'Report Period: {date.today().strftime("%B %Y")}'
-        ws2['A2'].font = Font(name='Arial', italic=True, size=10, color='666666')
-        ws2['A2'].alignment = Alignment(horizontal='center')
+        ws2.append([cell(
+            ws2, 'Anonymous Messages — Monthly Summary',
+            Font(name='Arial', bold=True, size=14, color='2E5090'),
+        )])
+        ws2.append([cell(
+            ws2, f'Report Period: {date.today().strftime("%B %Y")}',
+            Font(name='Arial', italic=True, size=10, color='666666'),
+        )])
+        ws2.append([])
 
         # Category breakdown
-        for col, hdr in enumerate(['Category', 'Count', 'Percentage'], 1):
-            c = ws2.cell(row=4, column=col, value=hdr)
-            c.font = Font(name='Arial', bold=True, color='FFFFFF')
-            c.fill = PatternFill(start_color='2E5090', end_color='2E5090', fill_type='solid')
-            c.alignment = Alignment(horizontal='center')
-            c.border = bdr
-
-        cat_counts = {}
-        for msg in messages:
-            lbl = category_labels.get(msg.category, msg.category or 'Unknown')
-            cat_counts[lbl] = cat_counts.get(lbl, 0) + 1
-
-        total = len(messages)
-        for i, (cat, cnt) in enumerate(cat_counts.items(), 5):
-            ws2.cell(row=i, column=1, value=cat).border = bdr
-            ws2.cell(row=i, column=2, value=cnt).border = bdr
-            pct = ws2.cell(row=i, column=3,
-                           value=f'=B{i}/B{5+len(cat_counts)}*100')
-            pct.border = bdr
-            pct.number_format = '0.0"%"'
-
-        total_row = 5 + len(cat_counts)
-        ws2.cell(row=total_row, column=1, value='TOTAL').font = Font(name='Arial', bold=True)
-        ws2.cell(row=total_row, column=1).border = bdr
-        ws2.cell(row=total_row, column=2,
-                 value=f'=SUM(B5:B{total_row-1})').font = Font(name='Arial', bold=True)
-        ws2.cell(row=total_row, column=2).border = bdr
-        ws2.cell(row=total_row, column=3, value='100%').border = bdr
-
-        ss = total_row + 3
-        ws2.merge_cells(f'A{ss}:C{ss}')
-        ws2.cell(row=ss, column=1,
-                 value='Status Breakdown').font = Font(name='Arial', bold=True, size=11)
-
-        for col, hdr in enumerate(['Status', 'Count', 'Percentage'], 1):
-            c = ws2.cell(row=ss + 1, column=col, value=hdr)
-            c.font = Font(name='Arial', bold=True, color='FFFFFF')
-            c.fill = PatternFill(start_color='2E5090', end_color='2E5090', fill_type='solid')
-            c.alignment = Alignment(horizontal='center')
-            c.border = bdr
-
-        status_counts = {}
-        for msg in messages:
-            lbl = state_labels.get(msg.state, msg.state or 'Unknown')
-            status_counts[lbl] = status_counts.get(lbl, 0) + 1
-
-        for i, (st, cnt) in enumerate(status_counts.items(), ss + 2):
-            ws2.cell(row=i, column=1, value=st).border = bdr
-            ws2.cell(row=i, column=2, value=cnt).border = bdr
-            ws2.cell(row=i, column=3,
-                     value=f'{round(cnt/total*100,1)}%' if total else '0%').border = bdr
+        sh_font = Font(name='Arial', bold=True, color='FFFFFF')
+        sh_fill = PatternFill(start_color='2E5090', end_color='2E5090', fill_type='solid')
+        sh_align = Alignment(horizontal='center')
+        ws2.append([
+            cell(ws2, hdr, sh_font, sh_fill, sh_align, bdr)
+            for hdr in ['Category', 'Count', 'Percentage']
+        ])
+
+        # Plain numbers rather than formulas: nothing to recalculate on open
+        pct_fmt = '0.0"%"'
+        total = sum(category_counts.values())
+        for cat, cnt in category_counts.items():
+            ws2.append([
+                cell(ws2, cat, border=bdr),
+                cell(ws2, cnt, border=bdr),
+                cell(ws2, cnt / total * 100, border=bdr, number_format=pct_fmt),
+            ])
+
+        ws2.append([
+            cell(ws2, 'TOTAL', Font(name='Arial', bold=True), border=bdr),
+            cell(ws2, total, Font(name='Arial', bold=True), border=bdr),
+            cell(ws2, 100 if total else 0, border=bdr, number_format=pct_fmt),
+        ])
+
+        ws2.append([])
+        ws2.append([])
+        ws2.append([cell(ws2, 'Status Breakdown', Font(name='Arial', bold=True, size=11))])
+        ws2.append([
+            cell(ws2, hdr, sh_font, sh_fill, sh_align, bdr)
+            for hdr in ['Status', 'Count', 'Percentage']
+        ])
+
+        for st, cnt in state_counts.items():
+            ws2.append([
+                cell(ws2, state_label(st, st or 'Unknown'), border=bdr),
+                cell(ws2, cnt, border=bdr),
+                cell(ws2, cnt / total * 100 if total else 0, border=bdr, number_format=pct_fmt),
+            ])
 
         buf = io.BytesIO()
         wb.save(buf)
-        buf.seek(0)
         return buf.getvalue()
 
     @api.model
@@ -554,11 +770,15 @@ class HrAnonymousMessage(models.Model):
             )
             return
 
-        hr_email = ICP.get_param('hr_anonymous_message.hr_email', default='').strip()
+        hr_email = self._get_hr_email()
         if not hr_email:
             _logger.error("Monthly report: HR email not configured. Aborting.")
             return
 
+        async_email = ICP.get_param(
+            'hr_anonymous_message.async_report_email', default='True'
+        ) in ('True', '1', 'true')
+
         if today.month == 1:
             report_month, report_year = 12, today.year - 1
         else:
@@ -571,7 +791,7 @@ class HrAnonymousMessage(models.Model):
             1,
         )
 
-        messages = self.sudo().search([
+        domain = [
             ('create_date', '>=', fields.Datetime.to_string(
                 datetime.combine(month_start, datetime.min.time())
             )),
@@ -579,13 +799,22 @@ class HrAnonymousMessage(models.Model):
                 datetime.combine(month_end, datetime.min.time())
             )),
             ('state', '!=', 'draft'),
-        ])
-
+        ]
         month_name = month_start.strftime('%B %Y')
+
+        if not self.sudo().search_count(domain):
+            _logger.info(f"No messages for {month_name}. Skipping report.")
+            return
+
+        messages = self.sudo().search(domain)
+        category_counts, state_counts = self._get_report_counts(domain)
+
         _logger.info(f"Found {len(messages)} messages for {month_name}")
 
         try:
-            excel_bytes = self._generate_excel_export(messages)
+            excel_bytes = self._generate_excel_export(
+                messages, category_counts, state_counts
+            )
         except Exception as e:
             _logger.error(f"Excel generation failed: {e}")
             _logger.exception("Traceback:")
@@ -594,136 +823,63 @@ class HrAnonymousMessage(models.Model):
         filename = f"Anonymous_Messages_{month_start.strftime('%B_%Y')}.xlsx"
 
         total          = len(messages)
-        resolved       = len(messages.filtered(lambda m: m.state == 'resolved'))
-        in_progress    = len(messages.filtered(lambda m: m.state == 'in_progress'))
-        pending        = len(messages.filtered(lambda m: m.state in ['sent', 'acknowledged']))
-        closed         = len(messages.filtered(lambda m: m.state == 'closed'))
-
-        email_body = f"""
-<div style="font-family:Arial,sans-serif;max-width:700px;margin:0 auto;
-            background:#f4f4f4;padding:20px;">
-
-  <!-- Header -->
-  <div style="background:linear-gradient(135deg,#2E5090 0%,#4A90D9 100%);
-              padding:32px 30px;border-radius:8px 8px 0 0;text-align:center;">
-    <div style="font-size:38px;margin-bottom:8px;">📊</div>
-    <h1 style="color:#fff;margin:0;font-size:22px;font-weight:bold;">
-      Monthly Anonymous Messages Report
-    </h1>
-    <p style="color:#d0e4f7;margin:8px 0 0;font-size:13px;">{month_name}</p>
-  </div>
-
-  <!-- Body -->
-  <div style="background:#fff;padding:30px;
-              border-left:1px solid #e0e0e0;border-right:1px solid #e0e0e0;">
-
-    <p style="font-size:15px;color:#333;margin-top:0;">Dear HR Team,</p>
-    <p style="font-size:14px;color:#555;line-height:1.7;">
-      Please find attached the <strong>monthly Excel report</strong> for
-      <strong>{month_name}</strong>, automatically generated by the
-      HR Anonymous Messaging System.
-    </p>
-
-    <!-- Stats card -->
-    <div style="background:#f8f9fa;border:1px solid #e9ecef;border-radius:6px;
-                padding:20px;margin:20px 0;">
-      <h3 style="margin:0 0 16px;color:#2E5090;font-size:15px;
-                 border-bottom:2px solid #2E5090;padding-bottom:8px;">
-        📋 Report Summary — {month_name}
-      </h3>
-      <table style="width:100%;font-size:13px;border-collapse:collapse;">
-        <tr>
-          <td style="padding:8px 0;color:#888;width:200px;">Total Messages</td>
-          <td style="padding:8px 0;font-weight:bold;color:#222;">{total}</td>
-        </tr>
-        <tr style="border-top:1px solid #f0f0f0;">
-          <td style="padding:8px 0;color:#888;">✅ Resolved</td>
-          <td style="padding:8px 0;font-weight:bold;color:#2e7d32;">{resolved}</td>
-        </tr>
-        <tr style="border-top:1px solid #f0f0f0;">
-          <td style="padding:8px 0;color:#888;">🔄 In Progress</td>
-          <td style="padding:8px 0;font-weight:bold;color:#e65100;">{in_progress}</td>
-        </tr>
-        <tr style="border-top:1px solid #f0f0f0;">
-          <td style="padding:8px 0;color:#888;">⏳ Pending Review</td>
-          <td style="padding:8px 0;font-weight:bold;color:#c62828;">{pending}</td>
-        </tr>
-        <tr style="border-top:1px solid #f0f0f0;">
-          <td style="padding:8px 0;color:#888;">🔒 Closed by Employee</td>
-          <td style="padding:8px 0;font-weight:bold;color:#555;">{closed}</td>
-        </tr>
-      </table>
-    </div>
-
-    <!-- Attachment notice -->
-    <div style="background:#e8f5e9;border:1px solid #a5d6a7;border-radius:4px;
-                padding:12px 16px;margin:20px 0;">
-      <p style="margin:0;font-size:13px;color:#2e7d32;">
-        📎 <strong>Attached:</strong> <em>{filename}</em><br/>
-        Contains two sheets:
-        <strong>Anonymous Messages</strong> (full list) and
-        <strong>Summary</strong> (category &amp; status breakdown).
-      </p>
-    </div>
-
-    <!-- Privacy notice -->
-    <div style="background:#fff3cd;border:1px solid #ffc107;border-radius:4px;
-                padding:12px 16px;margin:20px 0;">
-      <p style="margin:0;font-size:12px;color:#856404;">
-        🛡️ <strong>Privacy Notice:</strong> Sender identities are NOT included.
-        All messages remain fully anonymous in compliance with company policy.
-      </p>
-    </div>
-
-    <p style="font-size:13px;color:#555;margin-bottom:0;line-height:1.6;">
-      Kind regards,<br/>
-      <strong>HR Anonymous Messaging System</strong><br/>
-      <span style="color:#aaa;font-size:11px;">
-        Automated message — please do not reply.
-      </span>
-    </p>
-  </div>
-
-  <!-- Footer -->
-  <div style="background:#eee;padding:14px;text-align:center;
-              border-radius:0 0 8px 8px;border:1px solid #e0e0e0;border-top:none;">
-    <p style="margin:0;font-size:11px;color:#999;">
-      Generated on {today.strftime('%d %B %Y')} — Confidential HR Document.
-    </p>
-  </div>
-</div>"""
+        resolved       = state_counts.get('resolved', 0)
+        in_progress    = state_counts.get('in_progress', 0)
+        pending        = state_counts.get('sent', 0) + state_counts.get('acknowledged', 0)
+        closed         = state_counts.get('closed', 0)
+
+        email_body = Markup(_MONTHLY_REPORT_EMAIL_TEMPLATE.render(
+            month_name=month_name,
+            total=total,
+            resolved=resolved,
+            in_progress=in_progress,
+            pending=pending,
+            closed=closed,
+            filename=filename,
+            generated_on=today.strftime('%d %B %Y'),
+        ))
         
         try:
-            attachment = self.env['ir.attachment'].sudo().create({
-                'name': filename,
-                'datas': base64.b64encode(excel_bytes).decode('utf-8'),
-                'mimetype': (
-                    'application/vnd.openxmlformats-officedocument'
-                    '.spreadsheetml.sheet'
-                ),
-                'res_model': 'hr.anonymous.message',
-                'res_id': 0,
-                'type': 'binary',
-            })
+            # One savepoint for mail + attachment: if attaching fails, the
+            # queued mail is rolled back instead of going out without a file
+            with self.env.cr.savepoint():
+                mail = self.env['mail.mail'].sudo().create({
+                    'subject': f'Monthly Anonymous Messages Report — {month_name}',
+                    'email_to': hr_email,
+                    'email_from': self.env.company.email or hr_email,
+                    'body_html': email_body,
+                    'auto_delete': True,
+                })
+                _logger.info(f"Mail record created: id={mail.id}")
+
+                # Owned by the mail's message, so auto_delete removes the
+                # workbook together with the mail once it has been sent
+                attachment = self.env['ir.attachment'].sudo().create({
+                    'name': filename,
+                    'raw': excel_bytes,
+                    'mimetype': (
+                        'application/vnd.openxmlformats-officedocument'
+                        '.spreadsheetml.sheet'
+                    ),
+                    'res_model': 'mail.message',
+                    'res_id': mail.mail_message_id.id,
+                    'type': 'binary',
+                })
+                mail.attachment_ids = [(4, attachment.id)]
             _logger.info(f"Attachment created: id={attachment.id}, name={filename}")
 
-            mail = self.env['mail.mail'].sudo().create({
-                'subject': f'Monthly Anonymous Messages Report — {month_name}',
-                'email_to': hr_email,
-                'email_from': self.env.company.email or hr_email,
-                'body_html': email_body,
-                'auto_delete': True,
-                'attachment_ids': [(4, attachment.id)],
-            })
-            _logger.info(f"Mail record created: id={mail.id}")
-
-            mail.sudo().send()
-            _logger.info(
-                f"Monthly report sent to {hr_email} — "
-                f"{total} messages, attachment: {filename}"
-            )
-
-            attachment.sudo().unlink()
+            if async_email:
+                # Picked up by the outgoing mail queue cron
+                _logger.info(
+                    f"Monthly report queued for {hr_email} — "
+                    f"{total} messages, attachment: {filename}"
+                )
+            else:
+                mail.send()
+                _logger.info(
+                    f"Monthly report sent to {hr_email} — "
+                    f"{total} messages, attachment: {filename}"
+                )
 
         except Exception as e:
             _logger.error(f"Failed to send monthly report email: {e}")
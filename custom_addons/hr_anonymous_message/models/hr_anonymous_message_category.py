@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 
 
 class HrAnonymousMessageCategory(models.Model):
@@ -33,6 +33,28 @@ class HrAnonymousMessageCategory(models.Model):
     def name_get(self):
         return [(rec.id, rec.name) for rec in self]
 
+    @api.model
+    @tools.ormcache('self.env.lang')
+    def _get_category_choices(self):
+        """(id, name) pairs of active categories, cached until categories change"""
+        return tuple((rec.id, rec.name) for rec in self.sudo().search([]))
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        res = super().create(vals_list)
+        self.env.registry.clear_cache()
+        return res
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        return res
+
 
 class HrAnonymousMessagePriority(models.Model):
     
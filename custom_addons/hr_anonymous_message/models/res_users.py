@@ -11,7 +11,14 @@ class ResUsers(models.Model):
     )
     
     def _compute_anonymous_message_count(self):
+        groups = self.env['hr.anonymous.message'].read_group(
+            [('sender_user_id', 'in', self.ids)],
+            fields=['sender_user_id'],
+            groupby=['sender_user_id'],
+        )
+        counts = {
+            group['sender_user_id'][0]: group['sender_user_id_count']
+            for group in groups
+        }
         for user in self:
-            user.anonymous_message_count = self.env['hr.anonymous.message'].search_count([
-                ('sender_user_id', '=', user.id)
-            ])
\ No newline at end of file
+            user.anonymous_message_count = counts.get(user.id, 0)